@@ -1,29 +1,45 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import io
-from PyPDF2 import PdfReader
-from src.summarize import summarize_text
-from src.ner import extract_entities
-from src.qa import answer_question
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
+import json
+import os
+import random
+import threading
+import pypdfium2 as pdfium
+import torch
+from src.summarize import DEFAULT_NUM_BEAMS, load_summarizer, summarize_batch
+from src.batching import MicroBatcher
+from src.concurrency import run_model
+from src.config import QA_MAX_CONTEXT_LENGTH, threads_per_model_call
+from rouge_score import rouge_scorer
+from src.ner import extract_entities, load_ner_model
+from src.qa import answer_question, load_qa_model_and_tokenizer
 from src.groq_qa import (
     answer_question_groq,
     summarize_with_groq,
     chat_qa_with_groq,
+    aclose_client,
+    cache_clear,
 )
 from src.rag import (
     answer_question_rag,
     summarize_rag,
-    chunk_text,
-    build_index,
-    retrieve_top_k,
+    get_document_index,
+    retrieve_top_k_multi,
+    load_embedder,
 )
 from src.risk_classifier import (
     classify_legal_risk,
     classify_legal_risk_sections,
+    load_risk_classifier,
     RISK_LABELS,
 )
-from typing import Literal
+from src.tasks import celery_app, summarize_rag_task, analyze_task
+from celery.result import AsyncResult
+from typing import Any, Literal
 
 app = FastAPI(
     title="Legal Document Assistant API",
@@ -40,12 +56,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (extracted PDF text, RAG chunks, entity lists)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 
 class SummarizeRequest(BaseModel):
     text: str
     max_new_tokens: int | None = 256
     # Default "t5" so existing frontend keeps working.
     engine: Literal["t5", "bart"] = "t5"
+    num_beams: int | None = Field(default=DEFAULT_NUM_BEAMS, ge=1)
 
 
 class SummarizeResponse(BaseModel):
@@ -71,47 +91,212 @@ class SummarizeRagResponse(BaseModel):
     retrieved_chunks: list[str]
 
 
+def _summarize_batch_for_key(key, texts):
+    engine, max_new_tokens, num_beams = key
+    return summarize_batch(
+        texts, max_new_tokens=max_new_tokens, engine=engine, num_beams=num_beams
+    )
+
+
+# Concurrent summarize requests with the same generation settings
+# arriving within 20ms are run as one padded generate() batch
+_summary_batcher = MicroBatcher(
+    _summarize_batch_for_key,
+    max_batch_size=8,
+    max_wait_s=0.02,
+    runner=run_model,
+)
+
+
+async def summarize_text_batched(
+    text: str,
+    max_new_tokens: int = 256,
+    engine: Literal["t5", "bart"] = "t5",
+    num_beams: int = DEFAULT_NUM_BEAMS,
+) -> str:
+    return await _summary_batcher.submit((engine, max_new_tokens, num_beams), text)
+
+
+# Shadow mode: for this fraction of narrow-beam summaries, also run the
+# old 6-beam decode in the background and log ROUGE-L between the two,
+# to check quality before dropping wider beams for good. 0 = off.
+SUMMARY_SHADOW_RATE = float(os.getenv("SUMMARY_SHADOW_RATE", "0"))
+SHADOW_REFERENCE_BEAMS = 6
+_rouge = rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
+
+
+async def _shadow_compare(text, summary, engine, max_new_tokens, num_beams):
+    reference = await summarize_text_batched(
+        text,
+        max_new_tokens=max_new_tokens,
+        engine=engine,
+        num_beams=SHADOW_REFERENCE_BEAMS,
+    )
+    score = _rouge.score(reference, summary)["rougeL"].fmeasure
+    print(
+        f"[summary shadow] engine={engine} num_beams={num_beams} "
+        f"rougeL_vs_{SHADOW_REFERENCE_BEAMS}_beams={score:.3f}"
+    )
+
+
+def _maybe_shadow(background_tasks, text, summary, engine, max_new_tokens, num_beams):
+    if num_beams < SHADOW_REFERENCE_BEAMS and random.random() < SUMMARY_SHADOW_RATE:
+        background_tasks.add_task(
+            _shadow_compare, text, summary, engine, max_new_tokens, num_beams
+        )
+
+
+@app.on_event("startup")
+def configure_torch_threads():
+    # Split the cores between uvicorn workers and concurrent model calls
+    torch.set_num_threads(threads_per_model_call())
+
+
+def _warmup_models():
+    """
+    Load every lazily-cached model and run one tiny inference through
+    each, so the first real request doesn't pay the init cost.
+    """
+    load_qa_model_and_tokenizer()
+    load_ner_model()
+    load_embedder()
+    load_risk_classifier()
+    load_summarizer("t5")
+    load_summarizer("bart")
+    answer_question("x", "x")
+    answer_question("x", "x " * QA_MAX_CONTEXT_LENGTH)  # traced (long) path
+    extract_entities("x")
+    load_embedder().encode(["x"])
+    classify_legal_risk("x")
+    # A couple of decode steps is enough to trigger torch.compile
+    # (SUMMARIZER_BACKEND=torch) and ORT session setup
+    for engine in ("t5", "bart"):
+        summarize_batch(
+            ["x"], max_new_tokens=2, min_new_tokens=0,
+            engine=engine, num_beams=DEFAULT_NUM_BEAMS,
+        )
+
+
+@app.on_event("startup")
+async def warmup_models():
+    # Set WARMUP_MODELS=0 to skip (e.g. for quick local reloads)
+    if os.getenv("WARMUP_MODELS", "1") != "0":
+        await asyncio.to_thread(_warmup_models)
+
+
+@app.on_event("shutdown")
+async def close_groq_client():
+    await aclose_client()
+
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
 
+@app.post("/admin/cache_clear")
+async def cache_clear_endpoint():
+    """
+    Drop all cached Groq replies.
+    """
+    removed = await cache_clear()
+    return {"cleared": removed}
+
+
 @app.post("/summarize", response_model=SummarizeResponse)
-def summarize_endpoint(payload: SummarizeRequest):
+async def summarize_endpoint(payload: SummarizeRequest, background_tasks: BackgroundTasks):
     """
     Summarizing using fine-tuned models (T5 or BART).
 
     Default engine = "t5" (fine-tuned t5-billsum).
     Optionally, engine = "bart" to use fine-tuned BART.
+    num_beams defaults to 2; 1 is greedy decoding.
     """
-    summary = summarize_text(
+    max_new_tokens = payload.max_new_tokens or 256
+    num_beams = payload.num_beams or DEFAULT_NUM_BEAMS
+    summary = await summarize_text_batched(
         payload.text,
-        max_new_tokens=payload.max_new_tokens or 256,
+        max_new_tokens=max_new_tokens,
+        engine=payload.engine,
+        num_beams=num_beams,
+    )
+    _maybe_shadow(
+        background_tasks, payload.text, summary, payload.engine, max_new_tokens, num_beams
+    )
+    return SummarizeResponse(summary=summary)
+
+
+@app.post("/summarize_fast", response_model=SummarizeResponse)
+async def summarize_fast_endpoint(payload: SummarizeRequest, background_tasks: BackgroundTasks):
+    """
+    Fastest local summary: greedy decoding (num_beams=1, no sampling)
+    with the fine-tuned T5 or BART model. `num_beams` is ignored.
+    """
+    max_new_tokens = payload.max_new_tokens or 256
+    summary = await summarize_text_batched(
+        payload.text,
+        max_new_tokens=max_new_tokens,
         engine=payload.engine,
+        num_beams=1,
+    )
+    _maybe_shadow(
+        background_tasks, payload.text, summary, payload.engine, max_new_tokens, 1
     )
     return SummarizeResponse(summary=summary)
 
 
+class SummarizeBatchRequest(BaseModel):
+    texts: list[str]
+    max_new_tokens: int | None = 256
+    engine: Literal["t5", "bart"] = "t5"
+    num_beams: int | None = Field(default=DEFAULT_NUM_BEAMS, ge=1)
+
+
+class SummarizeBatchResponse(BaseModel):
+    summaries: list[str]
+
+
+@app.post("/summarize_batch", response_model=SummarizeBatchResponse)
+async def summarize_batch_endpoint(payload: SummarizeBatchRequest):
+    """
+    Summarize several texts with batched generate() calls
+    (fine-tuned T5 or BART). Summaries come back in input order.
+    """
+    # Bounded generate() batches: caps memory per call, and the model
+    # slot is released between chunks instead of held for the whole list
+    size = _summary_batcher.max_batch_size
+    summaries: list[str] = []
+    for start in range(0, len(payload.texts), size):
+        summaries += await run_model(
+            summarize_batch,
+            payload.texts[start : start + size],
+            max_new_tokens=payload.max_new_tokens or 256,
+            engine=payload.engine,
+            num_beams=payload.num_beams or DEFAULT_NUM_BEAMS,
+        )
+    return SummarizeBatchResponse(summaries=summaries)
+
+
 
 @app.post("/summarize_groq", response_model=SummarizeGenResponse)
-def summarize_groq_endpoint(payload: SummarizeGenRequest):
+async def summarize_groq_endpoint(payload: SummarizeGenRequest):
     """
     Summarizing text using Groq LLM (Llama3).
     """
-    summary = summarize_with_groq(
+    summary = await summarize_with_groq(
         payload.text,
         max_tokens=payload.max_new_tokens or 256,
     )
     return SummarizeGenResponse(summary=summary)
 
 @app.post("/summarize_rag", response_model=SummarizeRagResponse)
-def summarize_rag_endpoint(payload: SummarizeRagRequest):
+async def summarize_rag_endpoint(payload: SummarizeRagRequest):
     """
     RAG-based summarization:
     - Retrieve top-k chunks via embeddings
     - Summarize them with Groq
     """
-    result = summarize_rag(
+    result = await summarize_rag(
         full_text=payload.text,
         top_k=payload.top_k or 5,
     )
@@ -128,13 +313,14 @@ class NerResponse(BaseModel):
     entities: list
 
 @app.post("/ner", response_model=NerResponse)
-def ner_endpoint(payload: NerRequest):
+async def ner_endpoint(payload: NerRequest):
     """
     Extract entities (ORG, PERSON, DATE, MONEY, LAW REFERENCES, etc.)
     from legal/policy text.
     """
-    result = extract_entities(payload.text)
-    return NerResponse(entities=result["entities"])
+    result = await run_model(extract_entities, payload.text)
+    # Trusted output from our own code: skip re-validating every entity
+    return NerResponse.model_construct(entities=result["entities"])
 
 class QARequest(BaseModel):
     question: str
@@ -148,12 +334,13 @@ class QAResponse(BaseModel):
     end: int
 
 @app.post("/qa", response_model=QAResponse)
-def qa_endpoint(payload: QARequest):
+async def qa_endpoint(payload: QARequest):
     """
     Answer a question given a legal/policy context.
     Uses extractive QA (span prediction).
     """
-    result = answer_question(
+    result = await run_model(
+        answer_question,
         question=payload.question,
         context=payload.context,
     )
@@ -191,13 +378,13 @@ class SectionRiskResponse(BaseModel):
 
 
 @app.post("/risk", response_model=RiskResponse)
-def risk_endpoint(payload: RiskRequest):
+async def risk_endpoint(payload: RiskRequest):
     """
     Classify the legal risk level of the given text
     into Low / Medium / High using a transformer-based
     zero-shot classifier.
     """
-    scores = classify_legal_risk(payload.text)
+    scores = await run_model(classify_legal_risk, payload.text)
 
     # Here Picking label with highest score
     top_label = max(scores.items(), key=lambda x: x[1])[0]
@@ -208,7 +395,7 @@ def risk_endpoint(payload: RiskRequest):
     )
 
 @app.post("/risk_sections", response_model=SectionRiskResponse)
-def risk_sections_endpoint(payload: RiskRequest):
+async def risk_sections_endpoint(payload: RiskRequest):
     """
     Analyze legal risk per section.
 
@@ -216,7 +403,7 @@ def risk_sections_endpoint(payload: RiskRequest):
       - Split the document into sections (based on 'SECTION <number>' pattern).
       - Run risk classification (Low / Medium / High) on each section.
     """
-    results = classify_legal_risk_sections(payload.text)
+    results = await run_model(classify_legal_risk_sections, payload.text)
     return SectionRiskResponse(
         sections=[
             SectionRisk(
@@ -242,30 +429,43 @@ class AnalyzeResponse(BaseModel):
     qa: QAResult | None = None        
 
 @app.post("/analyze", response_model=AnalyzeResponse)
-def analyze_endpoint(payload: AnalyzeRequest):
+async def analyze_endpoint(payload: AnalyzeRequest):
     """
     Combined endpoint:
     - Summarizes the input text
     - Extracts entities
     - Optionally answers a question about the text
+
+    The three stages are independent, so they run concurrently (within
+    the MODEL_CONCURRENCY cap) and latency approaches the slowest stage.
     """
     # 1. Summary
-    summary = summarize_text(
-        text=payload.text,
+    summary_task = summarize_text_batched(
+        payload.text,
         max_new_tokens=payload.max_new_tokens or 256,
     )
 
     # 2. NER
-    ner_result = extract_entities(payload.text)
-    entities = ner_result["entities"]
+    ner_task = run_model(extract_entities, payload.text)
 
     # 3. Optional QA
-    qa_result = None
+    tasks = [summary_task, ner_task]
     if payload.question:
-        qa_raw = answer_question(
-            question=payload.question,
-            context=payload.text,
+        tasks.append(
+            run_model(
+                answer_question,
+                question=payload.question,
+                context=payload.text,
+            )
         )
+
+    results = await asyncio.gather(*tasks)
+    summary = results[0]
+    entities = results[1]["entities"]
+
+    qa_result = None
+    if payload.question:
+        qa_raw = results[2]
         qa_result = QAResult(
             answer=qa_raw["answer"],
             score=qa_raw["score"],
@@ -279,6 +479,55 @@ def analyze_endpoint(payload: AnalyzeRequest):
         qa=qa_result,
     )
 
+class TaskSubmitResponse(BaseModel):
+    task_id: str
+
+
+class TaskStatusResponse(BaseModel):
+    task_id: str
+    state: str
+    result: Any | None = None
+    error: str | None = None
+
+
+@app.post("/tasks/summarize_rag", response_model=TaskSubmitResponse)
+def submit_summarize_rag_task(payload: SummarizeRagRequest):
+    """
+    Queue a RAG summarization on the Celery worker and return its task id.
+    Poll GET /tasks/{task_id} for the result.
+    """
+    task = summarize_rag_task.delay(payload.text, payload.top_k or 5)
+    return TaskSubmitResponse(task_id=task.id)
+
+
+@app.post("/tasks/analyze", response_model=TaskSubmitResponse)
+def submit_analyze_task(payload: AnalyzeRequest):
+    """
+    Queue the combined summary + NER + QA pipeline on the Celery worker
+    and return its task id. Poll GET /tasks/{task_id} for the result.
+    """
+    task = analyze_task.delay(
+        payload.text,
+        payload.question,
+        payload.max_new_tokens or 256,
+    )
+    return TaskSubmitResponse(task_id=task.id)
+
+
+@app.get("/tasks/{task_id}", response_model=TaskStatusResponse)
+def task_status(task_id: str):
+    """
+    Status of a queued task: PENDING / STARTED / SUCCESS / FAILURE.
+    `result` is set on SUCCESS, `error` on FAILURE.
+    """
+    res = AsyncResult(task_id, app=celery_app)
+    if res.successful():
+        return TaskStatusResponse(task_id=task_id, state=res.state, result=res.result)
+    if res.failed():
+        return TaskStatusResponse(task_id=task_id, state=res.state, error=str(res.result))
+    return TaskStatusResponse(task_id=task_id, state=res.state)
+
+
 class QAGenRequest(BaseModel):
     question: str
     context: str
@@ -303,24 +552,57 @@ class ChatQAResponse(BaseModel):
     reply: str
 
 
+# How many recent user turns are used as retrieval queries in /chat_qa
+CHAT_RETRIEVAL_TURNS = 3
+
+
 @app.post("/qa_gen", response_model=QAGenResponse)
-def qa_gen_endpoint(payload: QAGenRequest):
+async def qa_gen_endpoint(payload: QAGenRequest):
     """
     Generative QA endpoint (Groq Llama3):
     Returns a natural-language answer, not just a span.
     """
-    answer = answer_question_groq(
+    answer = await answer_question_groq(
         question=payload.question,
         context=payload.context,
     )
     return QAGenResponse(answer=answer)
 
-@app.post("/extract_text")
-async def extract_text(file: UploadFile = File(...)):
+# PDFium is not thread-safe, even across different documents
+_pdfium_lock = threading.Lock()
+
+
+def _iter_pdf_pages(content: bytes):
     """
-    Extract text from an uploaded PDF and return it as plain text.
-    For now we only support .pdf files.
+    Yield the text of each PDF page with PDFium, one page at a time.
+    The lock is held per page, not across yields, so a slow streaming
+    client doesn't block other extractions.
+    """
+    with _pdfium_lock:
+        doc = pdfium.PdfDocument(content)
+        n_pages = len(doc)
+    try:
+        for i in range(n_pages):
+            with _pdfium_lock:
+                page = doc[i]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range() or ""
+                textpage.close()
+                page.close()
+            yield text
+    finally:
+        with _pdfium_lock:
+            doc.close()
+
+
+def _extract_pdf_pages(content: bytes) -> list[str]:
     """
+    Extract the text of every page of a PDF with PDFium.
+    """
+    return list(_iter_pdf_pages(content))
+
+
+def _require_pdf(file: UploadFile) -> None:
     filename = file.filename or ""
     if not filename.lower().endswith(".pdf"):
         raise HTTPException(
@@ -328,17 +610,21 @@ async def extract_text(file: UploadFile = File(...)):
             detail="Only PDF files are supported for text extraction.",
         )
 
+
+@app.post("/extract_text")
+async def extract_text(file: UploadFile = File(...)):
+    """
+    Extract text from an uploaded PDF and return it as plain text.
+    For now we only support .pdf files.
+    """
+    _require_pdf(file)
+
     try:
         # Read file content into memory
         content = await file.read()
-        pdf_bytes = io.BytesIO(content)
 
-        reader = PdfReader(pdf_bytes)
-        extracted_text_parts = []
-
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            extracted_text_parts.append(page_text)
+        # PDFium parsing is CPU-bound, keep it off the event loop
+        extracted_text_parts = await asyncio.to_thread(_extract_pdf_pages, content)
 
         full_text = "\n\n".join(extracted_text_parts).strip()
 
@@ -359,6 +645,34 @@ async def extract_text(file: UploadFile = File(...)):
             detail=f"Failed to extract text from PDF: {e}",
         )
 
+@app.post("/extract_text_stream")
+async def extract_text_stream(file: UploadFile = File(...)):
+    """
+    Streaming variant of /extract_text: returns NDJSON, one
+    {"page": n, "text": "..."} line per page as soon as it is extracted,
+    so clients can start on early pages of large PDFs.
+    """
+    _require_pdf(file)
+    content = await file.read()
+
+    def ndjson_pages():
+        try:
+            for page_no, text in enumerate(_iter_pdf_pages(content), start=1):
+                yield json.dumps({"page": page_no, "text": text}) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield json.dumps({"error": f"Failed to extract text from PDF: {e}"}) + "\n"
+
+    # Sync generators are iterated in the threadpool, off the event loop.
+    # An explicit Content-Encoding makes GZipMiddleware pass this through:
+    # gzip would buffer pages and deliver them in delayed bursts.
+    return StreamingResponse(
+        ndjson_pages(),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "identity"},
+    )
+
+
 class QARagRequest(BaseModel):
   question: str
   context: str
@@ -370,14 +684,14 @@ class QARagResponse(BaseModel):
   retrieved_chunks: list[str]
 
 @app.post("/qa_rag", response_model=QARagResponse)
-def qa_rag_endpoint(payload: QARagRequest):
+async def qa_rag_endpoint(payload: QARagRequest):
     """
     RAG-based QA:
     - Splits the full context into chunks
     - Retrieves top-k relevant chunks using embeddings
     - Asks Groq with only those chunks
     """
-    result = answer_question_rag(
+    result = await answer_question_rag(
         question=payload.question,
         full_context=payload.context,
         top_k=payload.top_k or 3,
@@ -388,41 +702,39 @@ def qa_rag_endpoint(payload: QARagRequest):
     )
 
 @app.post("/chat_qa", response_model=ChatQAResponse)
-def chat_qa_endpoint(payload: ChatQARequest):
+async def chat_qa_endpoint(payload: ChatQARequest):
     """
     Chat-style QA over the current context using Groq Llama3 + RAG.
 
     Steps:
-      1. Take the last user question from the chat history.
+      1. Take the last few user questions from the chat history.
       2. Chunk + embed the full context.
-      3. Retrieve top-k most relevant chunks for that question.
+      3. Retrieve top-k most relevant chunks for those questions.
       4. Send ONLY those chunks (rag_context) + trimmed history to Groq.
     """
     history = payload.messages
 
-    # 1) Get last user question (fallback if none)
-    last_user_question = None
-    for m in reversed(history):
-        if m.role == "user":
-            last_user_question = m.content
-            break
+    # 1) Get the recent user questions (fallback if none)
+    recent_questions = [
+        m.content for m in history if m.role == "user" and m.content.strip()
+    ][-CHAT_RETRIEVAL_TURNS:]
 
-    if not last_user_question:
-        last_user_question = (
+    if not recent_questions:
+        recent_questions = [
             "Answer the user's questions about the legal document as clearly as possible."
-        )
-
-    # 2) Chunk + embed the full context
-    chunks = chunk_text(payload.context)
-    if chunks:
-        chunk_texts, embeddings = build_index(chunks)
+        ]
 
-        # 3) Retrieve top-k chunks relevant to the last user question
+    # 2) Chunk + embed the full context (cached per document, so later
+    #    turns over the same context skip this; CPU-bound, so off the event loop)
+    chunk_texts, index = await run_model(get_document_index, payload.context)
+    if index is not None:
+        # 3) Retrieve top-k chunks relevant to the recent user questions
         top_k = 3
-        top_chunks = retrieve_top_k(
-            question=last_user_question,
+        top_chunks = await run_model(
+            retrieve_top_k_multi,
+            questions=recent_questions,
             chunk_texts=chunk_texts,
-            embeddings=embeddings,
+            index=index,
             top_k=top_k,
         )
 
@@ -432,7 +744,7 @@ def chat_qa_endpoint(payload: ChatQARequest):
         # Fallback: if chunking fails, just use the raw context
         rag_context = payload.context
 
-    reply = chat_qa_with_groq(
+    reply = await chat_qa_with_groq(
         context=rag_context,
         messages=[m.model_dump() for m in history],
     )
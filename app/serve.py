@@ -0,0 +1,88 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+import uvicorn
+
+from src.preload import preload_models
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def _load_shared_app():
+    """
+    Import the app and load the NLI risk model in the parent process.
+    Forked workers then share its weights copy-on-write instead of each
+    loading their own. (share_memory() wouldn't help here: the model is
+    dynamically int8-quantized, and its packed Linear weights are neither
+    parameters nor buffers.)
+    """
+    from app.main import app
+    from src import risk_classifier
+
+    risk_classifier.load_risk_classifier()
+    return app
+
+
+def _run_worker(config: uvicorn.Config, sock) -> None:
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _serve_forked(workers: int) -> None:
+    """
+    Fork `workers` uvicorn servers from a preloaded parent, all accepting
+    on one shared socket, and re-fork any worker that dies. (uvicorn's own
+    --workers always spawns, which re-imports the app and reloads every
+    model per worker.)
+    """
+    config = uvicorn.Config(_load_shared_app(), host=HOST, port=PORT)
+    sock = config.bind_socket()
+
+    multiprocessing.set_start_method("fork")
+
+    def _start_worker() -> multiprocessing.Process:
+        p = multiprocessing.Process(target=_run_worker, args=(config, sock))
+        p.start()
+        return p
+
+    procs = [_start_worker() for _ in range(workers)]
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for p in procs:
+            if p.is_alive():
+                p.terminate()  # SIGTERM -> graceful uvicorn shutdown
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    # Supervise: block until some worker exits, then replace it
+    while not stopping:
+        multiprocessing.connection.wait([p.sentinel for p in procs])
+        for i, p in enumerate(procs):
+            if not stopping and not p.is_alive():
+                p.join()
+                print(f"Worker {p.pid} exited with code {p.exitcode}; restarting")
+                time.sleep(1)  # don't spin if workers die on startup
+                procs[i] = _start_worker()
+
+    for p in procs:
+        p.join()
+    sock.close()
+
+
+# Production entrypoint: python -m app.serve
+# Models are fetched once here, before any workers start.
+if __name__ == "__main__":
+    preload_models()
+    # fork isn't available on Windows; fall back to uvicorn's spawned workers
+    if WEB_CONCURRENCY > 1 and "fork" in multiprocessing.get_all_start_methods():
+        _serve_forked(WEB_CONCURRENCY)
+    else:
+        uvicorn.run("app.main:app", host=HOST, port=PORT, workers=WEB_CONCURRENCY)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests for a short window and runs
+    them through a batch function in one call.
+
+    Items are grouped by `key` (e.g. generation settings), since only
+    items with the same settings can share a batch. `batch_fn(key, items)`
+    must return one result per item, in order. `runner` decides how the
+    blocking batch function is executed (default: a worker thread).
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[Hashable, List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_s: float = 0.02,
+        runner: Callable[..., Awaitable[Any]] | None = None,
+    ):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self._runner = runner or asyncio.to_thread
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._running: set = set()
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        queue = self._pending.setdefault(key, [])
+        queue.append((item, future))
+        if len(queue) >= self.max_batch_size:
+            self._flush(key)
+        elif len(queue) == 1:
+            self._timers[key] = loop.call_later(self.max_wait_s, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(key, batch))
+            # Keep a reference so the task isn't garbage-collected mid-run
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = await self._runner(self._batch_fn, key, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
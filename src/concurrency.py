@@ -0,0 +1,17 @@
+import asyncio
+
+from .config import MODEL_CONCURRENCY
+
+# At most MODEL_CONCURRENCY model calls (torch or ONNX Runtime) run at once
+# per worker; more would just fight over the same cores via intra-op
+# threads, which are sized for this cap (see threads_per_model_call).
+_model_semaphore = asyncio.Semaphore(MODEL_CONCURRENCY)
+
+
+async def run_model(func, *args, **kwargs):
+    """
+    Run a blocking model call in a worker thread, capped at
+    MODEL_CONCURRENCY concurrent calls.
+    """
+    async with _model_semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Root of the project directory
@@ -7,6 +8,9 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = PROJECT_ROOT / "data"
 MODELS_DIR = PROJECT_ROOT / "models"
 
+# On-disk cache of chunk embeddings used by the RAG pipeline
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+
 # Make sure the directories exist
 DATA_DIR.mkdir(exist_ok=True)
 MODELS_DIR.mkdir(exist_ok=True)
@@ -34,4 +38,40 @@ QA_MODEL_NAME = "deepset/roberta-base-squad2"
 QA_MAX_CONTEXT_LENGTH = 512
 
 
+# ---- Embedding (RAG) settings ----
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+# ---- Risk classification settings ----
+
+# Distilled BART-MNLI (12 encoder / 3 decoder layers): far fewer FLOPs
+# than facebook/bart-large-mnli for the same 3-label zero-shot task
+RISK_MODEL_NAME = "valhalla/distilbart-mnli-12-3"
+
+
+# ---- Inference threading ----
+
+# uvicorn workers per host, and concurrent model calls per worker
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "2"))
+
+
+def threads_per_model_call() -> int:
+    """
+    Intra-op threads for one model call: the cores split between uvicorn
+    workers and the concurrent model calls inside each worker.
+    """
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // (WEB_CONCURRENCY * MODEL_CONCURRENCY))
+
+
+# ---- Model loading ----
 
+def hf_local_files_only() -> bool:
+    """
+    True once preload_models() has put every hub model in the local cache
+    (it sets PRELOAD_DONE); loaders then skip hub round-trips.
+    Read at load time, since this module is imported before preload runs.
+    """
+    return bool(os.environ.get("PRELOAD_DONE"))
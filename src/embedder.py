@@ -0,0 +1,132 @@
+import shutil
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+from .config import MODELS_DIR, threads_per_model_call
+from .file_utils import publish_dir, scratch_dir
+
+# Quantized model file written by ORTQuantizer
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+# all-MiniLM-L6-v2 is trained with 256-token inputs
+MAX_SEQ_LENGTH = 256
+
+# Pad each batch up to a multiple of this, so ORT sees a handful of
+# recurring shapes instead of one per batch
+PAD_TO_MULTIPLE_OF = 32
+
+
+def onnx_model_dir(model_name: str) -> Path:
+    """
+    Where the exported INT8 ONNX model for `model_name` is stored.
+    """
+    return MODELS_DIR / (model_name.split("/")[-1] + "-onnx-int8")
+
+
+def export_quantized_embedder(model_name: str, out_dir: Path) -> Path:
+    """
+    One-time export of a sentence-transformer to ONNX with dynamic INT8
+    quantization. Returns the path of the quantized .onnx file.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    print(f"Exporting {model_name} to ONNX (int8) at {out_dir}")
+    # Left behind by an interrupted export from before exports were atomic
+    if out_dir.exists() and not (out_dir / QUANTIZED_FILE_NAME).exists():
+        shutil.rmtree(out_dir)
+
+    # Written to a staging dir and renamed into place when complete, so
+    # other workers never load a half-written model
+    tmp_dir = scratch_dir(out_dir)
+    tmp_dir.mkdir(parents=True)
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+
+    # Dynamic (weight-only calibration free) quantization of MatMul/Gemm
+    qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+
+    publish_dir(tmp_dir, out_dir)
+    return out_dir / QUANTIZED_FILE_NAME
+
+
+class OnnxEmbedder:
+    """
+    Minimal drop-in for SentenceTransformer.encode backed by an
+    INT8 ONNX Runtime session (mean pooling + optional L2 normalization).
+    """
+
+    def __init__(self, model_name: str, num_threads: int | None = None):
+        model_dir = onnx_model_dir(model_name)
+        model_path = model_dir / QUANTIZED_FILE_NAME
+        if not model_path.exists():
+            model_path = export_quantized_embedder(model_name, model_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        sess_options = ort.SessionOptions()
+        # Same per-call core budget as torch (see threads_per_model_call)
+        sess_options.intra_op_num_threads = num_threads or threads_per_model_call()
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            pad_to_multiple_of=PAD_TO_MULTIPLE_OF,
+            return_tensors="np",
+        )
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._input_names}
+        token_embs = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+
+        # Mean pooling over non-padding tokens
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embs * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+    ) -> np.ndarray:
+        """
+        Embed `sentences` into a (len(sentences), dim) float32 array.
+        `convert_to_numpy` is accepted for SentenceTransformer compatibility.
+        """
+        if not sentences:
+            return np.empty((0, self._dim), dtype=np.float32)
+
+        parts = [
+            self._encode_batch(sentences[i : i + batch_size])
+            for i in range(0, len(sentences), batch_size)
+        ]
+        embeddings = np.concatenate(parts, axis=0).astype(np.float32)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.clip(norms, 1e-12, None)
+        return embeddings
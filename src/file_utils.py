@@ -0,0 +1,27 @@
+import os
+import shutil
+from pathlib import Path
+
+
+def scratch_dir(final_dir: Path) -> Path:
+    """
+    Empty per-process staging directory next to `final_dir`, for writing
+    an artifact before publish_dir() moves it into place.
+    """
+    tmp_dir = final_dir.with_name(f"{final_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return tmp_dir
+
+
+def publish_dir(tmp_dir: Path, final_dir: Path) -> None:
+    """
+    Move a fully written `tmp_dir` into place in one rename, so a crash
+    mid-write never leaves a half-written `final_dir` behind. If another
+    process got there first, keep theirs.
+    """
+    try:
+        tmp_dir.rename(final_dir)
+    except OSError:
+        if not final_dir.exists():
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -1,5 +1,9 @@
+import hashlib
+import json
 import os
-import requests
+
+import httpx
+from cachetools import LRUCache
 
 from dotenv import load_dotenv
 load_dotenv()  # loading .env file
@@ -17,6 +21,136 @@ GROQ_MODEL_NAME = "llama-3.1-8b-instant"
 # ~ 4 chars ≈ 1 token, 6000 tokens ≈ 24,000 chars => we use 20,000 to be safe
 MAX_CONTEXT_CHARS = 20000
 
+# One shared client for the whole process so Groq calls reuse pooled
+# keep-alive (HTTP/2) connections instead of a new TLS handshake per request.
+_client = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
+
+
+# Cache of Groq replies keyed by a hash of the full request payload
+# (model + messages + sampling params), so identical prompts skip the
+# round-trip. If REDIS_URL is set, replies are also shared across workers.
+GROQ_CACHE_SIZE = 1024
+GROQ_CACHE_TTL = int(os.getenv("GROQ_CACHE_TTL", "3600"))  # seconds (Redis only)
+_CACHE_PREFIX = "groq:"
+
+_response_cache: LRUCache = LRUCache(maxsize=GROQ_CACHE_SIZE)
+
+REDIS_URL = os.getenv("REDIS_URL")
+_redis = None
+if REDIS_URL:
+    import redis.asyncio as aioredis  # optional dependency
+    from redis.exceptions import RedisError
+
+    # Short timeouts: a slow or dead Redis should cost a cache miss, not
+    # stall every Groq call
+    _redis = aioredis.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        socket_connect_timeout=1,
+        socket_timeout=1,
+    )
+
+
+async def aclose_client() -> None:
+    """
+    Close the shared Groq HTTP client (called on app shutdown).
+    """
+    await _client.aclose()
+    if _redis is not None:
+        await _redis.aclose()
+
+
+def _cache_key(payload: dict) -> str:
+    """
+    Stable hash of a Groq request payload.
+    """
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return _CACHE_PREFIX + hashlib.blake2b(raw.encode("utf-8")).hexdigest()
+
+
+async def _redis_get(key: str) -> str | None:
+    """
+    Look up `key` in Redis, treating an unavailable Redis as a miss.
+    """
+    try:
+        return await _redis.get(key)
+    except RedisError as e:
+        print(f"Redis cache unavailable, skipping lookup: {e}")
+        return None
+
+
+async def _redis_set(key: str, reply: str) -> None:
+    """
+    Store a reply in Redis; failures only mean it isn't shared.
+    """
+    try:
+        await _redis.setex(key, GROQ_CACHE_TTL, reply)
+    except RedisError as e:
+        print(f"Redis cache unavailable, reply not shared: {e}")
+
+
+async def cache_clear() -> int:
+    """
+    Drop all cached Groq replies (in-process and Redis).
+    Returns the number of in-process entries removed.
+    """
+    removed = len(_response_cache)
+    _response_cache.clear()
+    if _redis is not None:
+        try:
+            async for key in _redis.scan_iter(match=_CACHE_PREFIX + "*"):
+                await _redis.delete(key)
+        except RedisError as e:
+            print(f"Redis cache unavailable, not cleared: {e}")
+    return removed
+
+
+async def _chat_completion(payload: dict) -> str:
+    """
+    POST a chat-completions payload to Groq and return the reply text.
+    Identical payloads are served from the cache.
+    """
+    key = _cache_key(payload)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return cached
+    if _redis is not None:
+        cached = await _redis_get(key)
+        if cached is not None:
+            _response_cache[key] = cached
+            return cached
+
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+    response = await _client.post(
+        GROQ_API_URL,
+        headers=headers,
+        json=payload,
+    )
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"Groq API error {response.status_code}: {response.text}"
+        )
+
+    data = response.json()
+    try:
+        reply = data["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError) as e:
+        raise RuntimeError(f"Unexpected Groq API response format: {e}, data={data}")
+
+    _response_cache[key] = reply
+    if _redis is not None:
+        await _redis_set(key, reply)
+    return reply
+
 
 def _build_prompt(question: str, context: str) -> str:
     """
@@ -37,7 +171,7 @@ Answer in 2–4 sentences in clear, formal English.
 """
 
 
-def answer_question_groq(question: str, context: str) -> str:
+async def answer_question_groq(question: str, context: str) -> str:
     """
     Call Groq LLM (Llama 3) to answer a question based on context.
     Returns a natural language answer as a string.
@@ -54,11 +188,6 @@ def answer_question_groq(question: str, context: str) -> str:
 
     prompt = _build_prompt(question, context)
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "model": GROQ_MODEL_NAME,
         "messages": [
@@ -71,25 +200,7 @@ def answer_question_groq(question: str, context: str) -> str:
         "max_tokens": 256,
     }
 
-    response = requests.post(
-        GROQ_API_URL,
-        headers=headers,
-        json=payload,
-        timeout=30,
-    )
-
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Groq API error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
-    try:
-        answer = data["choices"][0]["message"]["content"].strip()
-    except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Unexpected Groq API response format: {e}, data={data}")
-
-    return answer
+    return await _chat_completion(payload)
 
 def _build_summary_prompt(text: str) -> str:
     """
@@ -106,7 +217,7 @@ TEXT:
 """
 
 
-def summarize_with_groq(text: str, max_tokens: int = 256) -> str:
+async def summarize_with_groq(text: str, max_tokens: int = 256) -> str:
     """
     Summarize a legal/policy text using Groq LLM (Llama3).
     """
@@ -117,11 +228,6 @@ def summarize_with_groq(text: str, max_tokens: int = 256) -> str:
 
     prompt = _build_summary_prompt(text)
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "model": GROQ_MODEL_NAME,
         "messages": [
@@ -134,27 +240,9 @@ def summarize_with_groq(text: str, max_tokens: int = 256) -> str:
         "max_tokens": max_tokens,
     }
 
-    response = requests.post(
-        GROQ_API_URL,
-        headers=headers,
-        json=payload,
-        timeout=30,
-    )
-
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Groq API error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
-    try:
-        answer = data["choices"][0]["message"]["content"].strip()
-    except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Unexpected Groq API response format: {e}, data={data}")
-
-    return answer
+    return await _chat_completion(payload)
 
-def chat_qa_with_groq(context: str, messages: list[dict]) -> str:
+async def chat_qa_with_groq(context: str, messages: list[dict]) -> str:
     """
     Chat-style QA over a legal/policy context.
     `messages` is a list of {"role": "user"|"assistant", "content": "..."}.
@@ -187,11 +275,6 @@ def chat_qa_with_groq(context: str, messages: list[dict]) -> str:
             role = "user"
         groq_messages.append({"role": role, "content": content})
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "model": GROQ_MODEL_NAME,
         "messages": groq_messages,
@@ -199,22 +282,4 @@ def chat_qa_with_groq(context: str, messages: list[dict]) -> str:
         "max_tokens": 256,
     }
 
-    response = requests.post(
-        GROQ_API_URL,
-        headers=headers,
-        json=payload,
-        timeout=30,
-    )
-
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Groq API error {response.status_code}: {response.text}"
-        )
-
-    data = response.json()
-    try:
-        reply = data["choices"][0]["message"]["content"].strip()
-    except (KeyError, IndexError) as e:
-        raise RuntimeError(f"Unexpected Groq API response format: {e}, data={data}")
-
-    return reply
+    return await _chat_completion(payload)
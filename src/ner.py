@@ -5,6 +5,14 @@ from functools import lru_cache
 
 MODEL_NAME = "en_core_web_sm"
 
+# Only the entity recognizer is needed; skip the rest of the pipeline
+DISABLED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer"]
+
+# Long documents are split into pieces of about this many characters
+# (on whitespace) and streamed through nlp.pipe
+CHUNK_CHARS = 1000
+PIPE_BATCH_SIZE = 32
+
 
 @lru_cache(maxsize=1)
 def load_ner_model():
@@ -12,7 +20,28 @@ def load_ner_model():
     Load spaCy NER model once and cache it.
     """
     print(f"Loading spaCy NER model: {MODEL_NAME}")
-    return spacy.load(MODEL_NAME)
+    return spacy.load(MODEL_NAME, disable=DISABLED_COMPONENTS)
+
+
+def _split_with_offsets(text: str, max_chars: int = CHUNK_CHARS):
+    """
+    Split text into ~max_chars pieces, breaking on whitespace so words
+    (and most entities) stay intact. Returns [(offset, piece), ...].
+    """
+    pieces = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + max_chars, n)
+        if end < n:
+            cut = text.rfind("\n", start, end)
+            if cut <= start:
+                cut = text.rfind(" ", start, end)
+            if cut > start:
+                end = cut
+        pieces.append((start, text[start:end]))
+        start = end
+    return pieces
 
 
 def extract_entities(text: str):
@@ -21,15 +50,20 @@ def extract_entities(text: str):
     Returns a list of entity dictionaries.
     """
     nlp = load_ner_model()
-    doc = nlp(text)
 
-    entities = []
-    for ent in doc.ents:
-        entities.append({
+    pieces = _split_with_offsets(text)
+    offsets = [offset for offset, _ in pieces]
+    docs = nlp.pipe((piece for _, piece in pieces), batch_size=PIPE_BATCH_SIZE)
+
+    entities = [
+        {
             "text": ent.text,
             "label": ent.label_,
-            "start_char": ent.start_char,
-            "end_char": ent.end_char
-        })
+            "start_char": offset + ent.start_char,
+            "end_char": offset + ent.end_char
+        }
+        for offset, doc in zip(offsets, docs)
+        for ent in doc.ents
+    ]
 
     return {"entities": entities}
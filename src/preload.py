@@ -0,0 +1,50 @@
+import os
+
+from huggingface_hub import list_repo_files, snapshot_download
+
+from .config import QA_MODEL_NAME, RISK_MODEL_NAME, EMBEDDING_MODEL_NAME
+
+# Models fetched from the Hugging Face hub (the fine-tuned summarizers
+# already live under models/ and never touch the hub)
+HUB_MODELS = [QA_MODEL_NAME, RISK_MODEL_NAME, EMBEDDING_MODEL_NAME]
+
+# Tokenizer and config files. Weights are added per repo, so the ONNX,
+# OpenVINO, TF and Rust exports some repos also ship are never fetched.
+_CONFIG_PATTERNS = ["*.json", "*.txt", "*.model"]
+
+
+def _allow_patterns(repo_id: str) -> list[str]:
+    """
+    Files to download for `repo_id`: configs/tokenizer plus one copy of
+    the PyTorch weights (safetensors when the repo has them, else .bin).
+    """
+    files = list_repo_files(repo_id)
+    if any(f.endswith(".safetensors") for f in files):
+        weights = "*.safetensors"
+    else:
+        weights = "pytorch_model*.bin"
+    return _CONFIG_PATTERNS + [weights]
+
+
+def preload_models() -> None:
+    """
+    Download every hub model into the local cache once, in the parent
+    process, then set PRELOAD_DONE so every later model load (here or
+    in a worker) uses local_files_only=True (no hub checks per worker).
+    """
+    from .embedder import QUANTIZED_FILE_NAME, export_quantized_embedder, onnx_model_dir
+    from .summarize import prepare_onnx_models
+
+    for name in HUB_MODELS:
+        print(f"Preloading model: {name}")
+        snapshot_download(name, allow_patterns=_allow_patterns(name))
+
+    # The ONNX embedder export also needs the hub, so do it here too
+    onnx_dir = onnx_model_dir(EMBEDDING_MODEL_NAME)
+    if not (onnx_dir / QUANTIZED_FILE_NAME).exists():
+        export_quantized_embedder(EMBEDDING_MODEL_NAME, onnx_dir)
+
+    # Same for the summarizers' ONNX export (SUMMARIZER_BACKEND=onnx)
+    prepare_onnx_models()
+
+    os.environ["PRELOAD_DONE"] = "1"
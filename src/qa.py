@@ -2,7 +2,16 @@ from functools import lru_cache
 
 import torch
 from transformers import AutoTokenizer, AutoModelForQuestionAnswering
-from .config import QA_MODEL_NAME, QA_MAX_CONTEXT_LENGTH
+from .config import QA_MODEL_NAME, QA_MAX_CONTEXT_LENGTH, hf_local_files_only
+
+# Answers whose confidence is below this are returned as "" (no answer)
+NO_ANSWER_THRESHOLD = 0.25
+
+# The traced model only takes inputs padded to QA_MAX_CONTEXT_LENGTH.
+# Shorter inputs run unpadded through the eager model instead: padding a
+# ~50-token question+context to 512 costs far more than tracing saves
+# (on CPU, eager is faster up to ~480 real tokens).
+QA_TRACED_MIN_LENGTH = 480
 
 
 def _get_device() -> torch.device:
@@ -20,15 +29,47 @@ def _get_device() -> torch.device:
 def load_qa_model_and_tokenizer():
     """
     Loading QA model + tokenizer once and cache them.
+
+    Returns (tokenizer, model, device, traced). `traced` is the model
+    traced with TorchScript on a QA_MAX_CONTEXT_LENGTH dummy input (None
+    if tracing failed), so inputs for it must be padded to that length.
+    Both are called as model(input_ids, attention_mask) and return a
+    (start_logits, end_logits) tuple.
     """
     print(f"Loading QA model: {QA_MODEL_NAME}")
-    tokenizer = AutoTokenizer.from_pretrained(QA_MODEL_NAME)
-    model = AutoModelForQuestionAnswering.from_pretrained(QA_MODEL_NAME)
+    tokenizer = AutoTokenizer.from_pretrained(
+        QA_MODEL_NAME, local_files_only=hf_local_files_only()
+    )
+    # torchscript=True -> tuple outputs, which torch.jit.trace needs
+    model = AutoModelForQuestionAnswering.from_pretrained(
+        QA_MODEL_NAME, torchscript=True, local_files_only=hf_local_files_only()
+    )
 
     device = _get_device()
     model.to(device)
     model.eval()
-    return tokenizer, model, device
+
+    dummy = tokenizer(
+        "dummy question",
+        "dummy context",
+        padding="max_length",
+        max_length=QA_MAX_CONTEXT_LENGTH,
+        return_tensors="pt",
+    ).to(device)
+    traced = None
+    try:
+        with torch.inference_mode():
+            traced = torch.jit.trace(
+                model, (dummy["input_ids"], dummy["attention_mask"])
+            )
+        traced = torch.jit.freeze(traced)
+        print("QA: Using TorchScript-traced model for long inputs")
+    except Exception as e:
+        # The eager model (same call convention) handles every input
+        traced = None
+        print(f"QA: TorchScript trace failed ({e}), using eager model")
+
+    return tokenizer, model, device, traced
 
 def answer_question(question: str, context: str) -> dict:
     """
@@ -42,7 +83,7 @@ def answer_question(question: str, context: str) -> dict:
             "end": int
         }
     """
-    tokenizer, model, device = load_qa_model_and_tokenizer()
+    tokenizer, model, device, traced = load_qa_model_and_tokenizer()
 
     encoded = tokenizer(
         question,
@@ -50,20 +91,31 @@ def answer_question(question: str, context: str) -> dict:
         truncation=True,
         max_length=QA_MAX_CONTEXT_LENGTH,
         return_tensors="pt",
-    ).to(device)
-
-    with torch.no_grad():
-        outputs = model(**encoded)
-        start_logits = outputs.start_logits
-        end_logits = outputs.end_logits
-
-    # Converting logits to probabilities
-    start_probs = torch.softmax(start_logits, dim=-1)
-    end_probs = torch.softmax(end_logits, dim=-1)
-
-    # start/end index
-    start_idx = int(torch.argmax(start_probs, dim=-1)[0])
-    end_idx = int(torch.argmax(end_probs, dim=-1)[0])
+    )
+    if traced is not None and encoded["input_ids"].shape[1] >= QA_TRACED_MIN_LENGTH:
+        # Pad to the fixed length the traced model was built for
+        encoded = tokenizer.pad(
+            encoded,
+            padding="max_length",
+            max_length=QA_MAX_CONTEXT_LENGTH,
+            return_tensors="pt",
+        )
+        model = traced
+    encoded = encoded.to(device)
+
+    with torch.inference_mode():
+        start_logits, end_logits = model(
+            encoded["input_ids"], encoded["attention_mask"]
+        )[:2]
+
+    # Padding positions must never be picked as the answer span
+    pad_mask = encoded["attention_mask"] == 0
+    start_logits = start_logits.masked_fill(pad_mask, float("-inf"))
+    end_logits = end_logits.masked_fill(pad_mask, float("-inf"))
+
+    # start/end index (argmax is the same on logits and probabilities)
+    start_idx = int(start_logits[0].argmax())
+    end_idx = int(end_logits[0].argmax())
 
     if end_idx < start_idx:
         end_idx = start_idx
@@ -74,16 +126,16 @@ def answer_question(question: str, context: str) -> dict:
     # Decoding while skipping special tokens like <s>, </s>, <pad>, etc.
     answer = tokenizer.decode(answer_ids, skip_special_tokens=True).strip()
 
-    # Confidence score: average of start/end probs at chosen indices
-    start_score = float(start_probs[0, start_idx].item())
-    end_score = float(end_probs[0, end_idx].item())
+    # Confidence score: average of start/end softmax probs at chosen indices,
+    # computed only at those indices: p_i = exp(logit_i - logsumexp(logits))
+    start_score = float(torch.exp(start_logits[0, start_idx] - torch.logsumexp(start_logits[0], dim=-1)))
+    end_score = float(torch.exp(end_logits[0, end_idx] - torch.logsumexp(end_logits[0], dim=-1)))
     score = (start_score + end_score) / 2.0
 
     # Heuristic: if answer is empty or looks like junk, treat as "no answer"
     if not answer or answer in {"<s>", "</s>", tokenizer.cls_token, tokenizer.sep_token}:
         answer = ""
     # Optional: threshold – if score too low, say no answer
-    NO_ANSWER_THRESHOLD = 0.25
     if score < NO_ANSWER_THRESHOLD:
         answer = ""
 
@@ -1,28 +1,105 @@
 from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
 from functools import lru_cache
 from typing import List, Tuple
 
+import faiss
 import numpy as np
 import nltk
-from nltk.tokenize import sent_tokenize
-from sentence_transformers import SentenceTransformer
+from cachetools import LRUCache
+from diskcache import Cache
 
+from .concurrency import run_model
+from .config import EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME
+from .embedder import OnnxEmbedder
 from .groq_qa import answer_question_groq, summarize_with_groq
 # Ensuring punkt is available for sentence splitting
+# (nltk >= 3.9 ships it as "punkt_tab", older versions as "punkt")
 try:
-    nltk.data.find("tokenizers/punkt")
-except LookupError:
-    nltk.download("punkt")
+    from nltk.tokenize import PunktTokenizer
+
+    try:
+        nltk.data.find("tokenizers/punkt_tab/english/")
+    except LookupError:
+        nltk.download("punkt_tab")
+    _sentence_tokenizer = PunktTokenizer("english")
+except ImportError:
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        nltk.download("punkt")
+    _sentence_tokenizer = nltk.data.load("tokenizers/punkt/english.pickle")
+
+
+# Per-chunk embedding cache: a bounded in-memory layer in front of an
+# on-disk store, so re-sent documents (and repeated chat turns) only
+# embed chunks we have never seen before.
+_EMBEDDING_MEMORY_SIZE = 20000
+_embedding_memory: LRUCache = LRUCache(maxsize=_EMBEDDING_MEMORY_SIZE)
+_embedding_memory_lock = threading.Lock()
+_embedding_disk = Cache(str(EMBEDDING_CACHE_DIR))
 
 
 @lru_cache(maxsize=1)
-def load_embedder() -> SentenceTransformer:
+def load_embedder() -> OnnxEmbedder:
+    """
+    Loading the INT8 ONNX Runtime version of the sentence-transformer
+    once and cache it (exported on first use).
+    """
+    print(f"Loading embedding model: {EMBEDDING_MODEL_NAME} (onnx int8)")
+    return OnnxEmbedder(EMBEDDING_MODEL_NAME)
+
+
+def _chunk_key(chunk: str) -> str:
     """
-    Loading a sentence-transformer model once and cache it.
+    Cache key for a chunk embedding (includes the model name so a model
+    swap never serves stale vectors).
     """
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    print(f"Loading embedding model: {model_name}")
-    return SentenceTransformer(model_name)
+    raw = f"{EMBEDDING_MODEL_NAME}:onnx-int8\0{chunk}".encode("utf-8")
+    return hashlib.blake2b(raw).hexdigest()
+
+
+def _get_cached_embedding(key: str) -> np.ndarray | None:
+    with _embedding_memory_lock:
+        emb = _embedding_memory.get(key)
+    if emb is None:
+        emb = _embedding_disk.get(key)
+        if emb is not None:
+            with _embedding_memory_lock:
+                _embedding_memory[key] = emb
+    return emb
+
+
+def _store_embedding(key: str, emb: np.ndarray) -> None:
+    # Cached as FP16: half the RAM/disk, plenty of precision for cosine ranking
+    emb = emb.astype(np.float16)
+    with _embedding_memory_lock:
+        _embedding_memory[key] = emb
+    _embedding_disk.set(key, emb)
+
+
+def chunk_spans(
+    text: str,
+    max_sentences_per_chunk: int = 5,
+    overlap: int = 1,
+) -> List[Tuple[int, int]]:
+    """
+    Character (start, end) offsets of overlapping sentence windows in `text`.
+    Sentences are tokenized once to spans; no intermediate strings are built.
+    """
+    spans = list(_sentence_tokenizer.span_tokenize(text))
+    step = max_sentences_per_chunk - overlap
+    windows = []
+    i = 0
+    while i < len(spans):
+        last = min(i + max_sentences_per_chunk, len(spans)) - 1
+        windows.append((spans[i][0], spans[last][1]))
+        if step <= 0:  # avoid infinite loop
+            break
+        i += step
+    return windows
 
 
 def chunk_text(
@@ -32,56 +109,194 @@ def chunk_text(
 ) -> List[str]:
     """
     Spliting long text into overlapping sentence chunks.
+    Each chunk is a slice of the original text (see chunk_spans for offsets).
 
     Example:
         [s1, s2, s3, s4, s5, s6] with max_sentences_per_chunk=3, overlap=1
         -> [s1 s2 s3], [s3 s4 s5], [s5 s6]
     """
-    sentences = sent_tokenize(text)
     chunks = []
-    i = 0
-    while i < len(sentences):
-        chunk_sents = sentences[i : i + max_sentences_per_chunk]
-        chunk_text = " ".join(chunk_sents).strip()
-        if chunk_text:
-            chunks.append(chunk_text)
-        i += max_sentences_per_chunk - overlap
-        if max_sentences_per_chunk == overlap:  # avoid infinite loop
-            break
+    for start, end in chunk_spans(text, max_sentences_per_chunk, overlap):
+        chunk = text[start:end]
+        if chunk.strip():
+            chunks.append(chunk)
     return chunks
 
 
+def _encode_sorted(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Embed texts in length order so each batch pads to similar lengths,
+    then restore the original order.
+    """
+    lens = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    order = np.argsort(lens, kind="stable")
+    embedder = load_embedder()
+    sorted_embs = embedder.encode(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+    inv = np.argsort(order)
+    return sorted_embs[inv]
+
+
 def build_index(chunks: List[str]) -> Tuple[List[str], np.ndarray]:
     """
     Building an in-memory 'index':
       - chunk_texts: the original text chunks
       - embeddings: 2D numpy array of shape (num_chunks, dim)
     """
-    embedder = load_embedder()
-    embeddings = embedder.encode(chunks, convert_to_numpy=True, normalize_embeddings=True)
+    if not chunks:
+        dim = load_embedder().get_sentence_embedding_dimension()
+        return chunks, np.empty((0, dim), dtype=np.float32)
+
+    keys = [_chunk_key(c) for c in chunks]
+    found = {k: _get_cached_embedding(k) for k in set(keys)}
+
+    # Only embed chunks we haven't seen before (deduplicated)
+    missing_keys = [k for k, emb in found.items() if emb is None]
+    if missing_keys:
+        key_to_chunk = dict(zip(keys, chunks))
+        missing = [key_to_chunk[k] for k in missing_keys]
+        new_embs = _encode_sorted(missing)
+        for k, emb in zip(missing_keys, new_embs):
+            _store_embedding(k, emb)
+            found[k] = emb
+
+    # Contiguous float32, as FAISS expects on input
+    embeddings = np.ascontiguousarray(np.stack([found[k] for k in keys]), dtype=np.float32)
     return chunks, embeddings
 
 
+@lru_cache(maxsize=256)
+def _embed_query(question: str) -> np.ndarray:
+    """
+    Embed a retrieval query; repeated queries (e.g. the fixed summary
+    query) are served from the cache.
+    """
+    embedder = load_embedder()
+    q_emb = embedder.encode([question], convert_to_numpy=True, normalize_embeddings=True)[0]
+    return np.ascontiguousarray(q_emb, dtype=np.float32)
+
+
+# Per-document FAISS indexes keyed by sha256(text), so multi-turn chat
+# (and repeated RAG calls) over the same document skip chunking and
+# embedding entirely. Oldest documents are evicted first.
+_DOC_CACHE_SIZE = 64
+_doc_cache: "OrderedDict[str, Tuple[List[str], faiss.Index]]" = OrderedDict()
+_doc_cache_lock = threading.Lock()
+
+
+def _build_faiss_index(embeddings: np.ndarray) -> faiss.Index:
+    """
+    Exhaustive inner-product index (cosine similarity on normalized
+    vectors) storing vectors as FP16, which halves the memory scanned
+    per search; queries stay FP32.
+    """
+    index = faiss.IndexScalarQuantizer(
+        embeddings.shape[1],
+        faiss.ScalarQuantizer.QT_fp16,
+        faiss.METRIC_INNER_PRODUCT,
+    )
+    index.add(embeddings)
+    return index
+
+
+def get_document_index(text: str) -> Tuple[List[str], faiss.Index | None]:
+    """
+    Return (chunk_texts, index) for a document, building and caching it
+    on first use. index is None when the text yields no chunks.
+    """
+    doc_key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _doc_cache_lock:
+        cached = _doc_cache.get(doc_key)
+        if cached is not None:
+            _doc_cache.move_to_end(doc_key)
+            return cached
+
+    chunks = chunk_text(text)
+    if not chunks:
+        return chunks, None
+
+    chunk_texts, embeddings = build_index(chunks)
+    entry = (chunk_texts, _build_faiss_index(embeddings))
+
+    with _doc_cache_lock:
+        _doc_cache[doc_key] = entry
+        _doc_cache.move_to_end(doc_key)
+        while len(_doc_cache) > _DOC_CACHE_SIZE:
+            _doc_cache.popitem(last=False)
+    return entry
+
+
 def retrieve_top_k(
     question: str,
     chunk_texts: List[str],
-    embeddings: np.ndarray,
+    index: faiss.Index,
     top_k: int = 3,
 ) -> List[str]:
     """
     Retrieving top-k most relevant chunks for a question using cosine similarity.
     """
+    if top_k <= 0 or index.ntotal == 0:
+        return []
+
+    q_emb = _embed_query(question)
+
+    # Cosine similarity since vectors are normalized: inner product
+    _, ids = index.search(q_emb[None, :], min(top_k, index.ntotal))
+    return [chunk_texts[i] for i in ids[0] if i >= 0]
+
+
+def retrieve_top_k_multi(
+    questions: List[str],
+    chunk_texts: List[str],
+    index: faiss.Index,
+    top_k: int = 3,
+) -> List[str]:
+    """
+    Retrieving top-k chunks for several queries at once (e.g. the recent
+    user turns of a chat). All queries are embedded in one batch and
+    searched in one call; a chunk's score is its best score over queries.
+    """
+    if not questions:
+        return []
+    if len(questions) == 1:
+        return retrieve_top_k(questions[0], chunk_texts, index, top_k=top_k)
+    if top_k <= 0 or index.ntotal == 0:
+        return []
+
     embedder = load_embedder()
-    q_emb = embedder.encode([question], convert_to_numpy=True, normalize_embeddings=True)[0]
+    q_embs = embedder.encode(questions, convert_to_numpy=True, normalize_embeddings=True)
+    q_embs = np.ascontiguousarray(q_embs, dtype=np.float32)
 
-    # Cosine similarity since vectors are normalized: dot product
-    scores = embeddings @ q_emb  # shape: (num_chunks,)
-    top_indices = np.argsort(scores)[::-1][:top_k]
+    # The overall top-k by max score is always within each query's own top-k
+    k = min(top_k, index.ntotal)
+    scores, ids = index.search(q_embs, k)
 
+    best: dict[int, float] = {}
+    for i, score in zip(ids.ravel(), scores.ravel()):
+        if i >= 0 and score > best.get(i, float("-inf")):
+            best[int(i)] = float(score)
+
+    top_indices = sorted(best, key=best.get, reverse=True)[:top_k]
     return [chunk_texts[i] for i in top_indices]
 
 
-def answer_question_rag(question: str, full_context: str, top_k: int = 3) -> dict:
+def _retrieve_for_query(text: str, query: str, top_k: int) -> List[str]:
+    """
+    Look up (or build) the document index for `text` and return the
+    top-k chunks for `query`.
+    Kept synchronous so async callers can run it in a worker thread.
+    """
+    chunk_texts, index = get_document_index(text)
+    if index is None:
+        return []
+    return retrieve_top_k(query, chunk_texts, index, top_k=top_k)
+
+
+async def answer_question_rag(question: str, full_context: str, top_k: int = 3) -> dict:
     """
     End-to-end RAG-style QA:
       1. Chunks the full context into sentence windows.
@@ -90,56 +305,53 @@ def answer_question_rag(question: str, full_context: str, top_k: int = 3) -> dic
       4. Concatenates these chunks into a focused context.
       5. Asks Groq LLM (Llama3) to answer using only that focused context.
     """
-    # 1–2. Building index
-    chunks = chunk_text(full_context)
-    if not chunks:
+    # 1–3. Building index and retrieving top-k relevant chunks
+    # (CPU-bound embedding runs off the event loop, under the model cap)
+    top_chunks = await run_model(
+        _retrieve_for_query, full_context, question, top_k
+    )
+    if not top_chunks:
         return {
             "answer": "No usable text found in the context.",
             "retrieved_chunks": [],
         }
 
-    chunk_texts, embeddings = build_index(chunks)
-
-    # 3. Retrievng top-k relevant chunks
-    top_chunks = retrieve_top_k(question, chunk_texts, embeddings, top_k=top_k)
-
     # 4. Concatenating into a smaller context for Groq
     focused_context = "\n\n".join(top_chunks)
 
     # 5. Asking Groq using the focused context
-    answer = answer_question_groq(question=question, context=focused_context)
+    answer = await answer_question_groq(question=question, context=focused_context)
 
     return {
         "answer": answer,
         "retrieved_chunks": top_chunks,
     }
 
-def summarize_rag(full_text: str, top_k: int = 5) -> dict:
+async def summarize_rag(full_text: str, top_k: int = 5) -> dict:
     """
     RAG-style summarization:
       1. Chunk the full text.
       2. Use a generic 'summary' query to retrieve top-k chunks.
       3. Ask Groq to summarize only those chunks.
     """
-    chunks = chunk_text(full_text)
-    if not chunks:
-        return {
-            "summary": "No usable text found to summarize.",
-            "retrieved_chunks": [],
-        }
-
-    chunk_texts, embeddings = build_index(chunks)
-
     # Generic query representing "summary of the document"
     summary_query = (
         "What are the main obligations, rights, and key points described "
         "in this legal or policy text?"
     )
 
-    top_chunks = retrieve_top_k(summary_query, chunk_texts, embeddings, top_k=top_k)
+    top_chunks = await run_model(
+        _retrieve_for_query, full_text, summary_query, top_k
+    )
+    if not top_chunks:
+        return {
+            "summary": "No usable text found to summarize.",
+            "retrieved_chunks": [],
+        }
+
     focused_context = "\n\n".join(top_chunks)
 
-    summary = summarize_with_groq(focused_context)
+    summary = await summarize_with_groq(focused_context)
 
     return {
         "summary": summary,
@@ -1,15 +1,133 @@
-from typing import Dict
-from transformers import pipeline
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, List
+import torch
+import xxhash
+from cachetools import LRUCache
+
+from .config import RISK_MODEL_NAME, hf_local_files_only
+
+
+@lru_cache(maxsize=1)
+def load_risk_classifier():
+    """
+    Load the NLI tokenizer and model on first use and cache them, with
+    the model's Linear layers dynamically quantized to int8 (CPU).
+    Returns (tokenizer, model).
+    """
+    # transformers is imported here so importing this module stays cheap
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(
+        RISK_MODEL_NAME, local_files_only=hf_local_files_only()
+    )
+    model = AutoModelForSequenceClassification.from_pretrained(
+        RISK_MODEL_NAME,
+        local_files_only=hf_local_files_only(),
+        attn_implementation="sdpa",  # fused attention kernels
+    )
+    model.eval()
+    model = torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return tokenizer, model
 
-# Loading a zero-shot classification model once at import time
-# (facebook/bart-large-mnli is widely used for zero-shot)
-_risk_classifier = pipeline(
-    "zero-shot-classification",
-    model="facebook/bart-large-mnli",
-)
 
 RISK_LABELS = ["Low risk", "Medium risk", "High risk"]
 
+# NLI hypothesis per label (the zero-shot pipeline's default template).
+# Note: these can't be encoded once and reused across sections. BART-MNLI
+# reads "<premise></s></s><hypothesis>" as one sequence with bidirectional
+# self-attention, so hypothesis token states depend on each premise.
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+# Sections per NLI forward batch (each section expands to one NLI
+# pair per label). Lower it on small-RAM hosts, raise it on GPUs.
+RISK_BATCH_SIZE = int(os.getenv("RISK_BATCH_SIZE", "8"))
+
+
+# Scores for section texts we've already classified, keyed by a 64-bit
+# xxhash of the text: boilerplate sections (definitions, signatures)
+# repeat verbatim across documents and skip the model entirely.
+# Entries are (text, scores); a hit only counts if the text matches, so
+# a hash collision is a miss rather than another section's scores.
+_SCORE_CACHE_SIZE = 4096
+_score_cache: LRUCache = LRUCache(maxsize=_SCORE_CACHE_SIZE)
+_score_cache_lock = threading.Lock()
+
+
+def _entailment_id(model) -> int:
+    # Same lookup the zero-shot pipeline does on the model config
+    for label, idx in model.config.label2id.items():
+        if label.lower().startswith("entail"):
+            return idx
+    return -1
+
+
+def _nli_scores(premises: List[str]) -> List[Dict[str, float]]:
+    """
+    Score every (premise, label hypothesis) pair in one forward pass,
+    then softmax each premise's entailment logits over the labels
+    (what the zero-shot pipeline does with multi_label=False).
+    """
+    tokenizer, model = load_risk_classifier()
+    hypotheses = [HYPOTHESIS_TEMPLATE.format(label) for label in RISK_LABELS]
+
+    # (N * num_labels) pairs, premise-major
+    inputs = tokenizer(
+        [p for p in premises for _ in RISK_LABELS],
+        hypotheses * len(premises),
+        padding=True,
+        truncation="only_first",  # never cut the hypothesis
+        return_tensors="pt",
+    )
+    with torch.inference_mode():
+        logits = model(**inputs).logits
+
+    entail = logits[:, _entailment_id(model)].view(len(premises), len(RISK_LABELS))
+    probs = entail.softmax(dim=-1).tolist()
+    return [dict(zip(RISK_LABELS, row)) for row in probs]
+
+
+def classify_legal_risk_batch(texts: List[str]) -> List[Dict[str, float]]:
+    """
+    Classify many texts with batched NLI forward passes (all label
+    hypotheses for RISK_BATCH_SIZE texts at a time) instead of one
+    pass per text.
+
+    Returns one label -> score dict per input, in input order.
+    """
+    results: List[Dict[str, float]] = [
+        {label: 0.0 for label in RISK_LABELS} for _ in texts
+    ]
+
+    # Serve repeated texts from the cache; classify each new text once
+    todo: Dict[str, List[int]] = {}  # text -> positions in `texts`
+    for i, t in enumerate(texts):
+        if not t or not t.strip():
+            continue
+        with _score_cache_lock:
+            cached = _score_cache.get(xxhash.xxh64_intdigest(t))
+        if cached is not None and cached[0] == t:
+            results[i] = dict(cached[1])
+        else:
+            todo.setdefault(t, []).append(i)
+    if not todo:
+        return results
+
+    new_texts = list(todo)
+    outputs: List[Dict[str, float]] = []
+    for start in range(0, len(new_texts), RISK_BATCH_SIZE):
+        outputs.extend(_nli_scores(new_texts[start : start + RISK_BATCH_SIZE]))
+
+    for t, scores in zip(new_texts, outputs):
+        with _score_cache_lock:
+            _score_cache[xxhash.xxh64_intdigest(t)] = (t, scores)
+        for i in todo[t]:
+            results[i] = dict(scores)
+    return results
+
 
 def classify_legal_risk(text: str) -> Dict[str, float]:
     """
@@ -18,41 +136,53 @@ def classify_legal_risk(text: str) -> Dict[str, float]:
 
     Returns a dict mapping label -> score, normalized to sum ~1.
     """
-    if not text or not text.strip():
-        return {label: 0.0 for label in RISK_LABELS}
+    return classify_legal_risk_batch([text])[0]
 
-    result = _risk_classifier(
-        text,
-        candidate_labels=RISK_LABELS,
-        multi_label=False,  # picks a single best label
-    )
+import re
+from itertools import pairwise
+from typing import List, Dict, Tuple
 
-    # result["labels"] is ordered by descending score
-    labels = result["labels"]
-    scores = result["scores"]
+# ... existing RISK_LABELS and classify_legal_risk above ...
 
-    # Normalizing to a dict with consistent label ordering
-    scores_dict = {label: 0.0 for label in RISK_LABELS}
-    for label, score in zip(labels, scores):
-        if label in scores_dict:
-            scores_dict[label] = float(score)
 
-    # Optional: re-normalize to sum to 1.0
-    total = sum(scores_dict.values()) or 1.0
-    scores_dict = {k: v / total for k, v in scores_dict.items()}
+# Prefer Google RE2 (linear-time DFA, literal prefiltering) when the
+# optional google-re2 package is installed; the pattern is valid in both.
+try:
+    import re2 as _regex_engine
+except ImportError:
+    _regex_engine = re
 
-    return scores_dict
+# Matches only the start of a section heading; section bodies are sliced
+# from one heading to the next, so the regex never scans ahead.
+# (Inline (?i) instead of re.IGNORECASE so RE2 accepts it too.)
+SECTION_PATTERN = _regex_engine.compile(r"(?i)SECTION\s+\d+[A-Za-z0-9.\-]*")
 
-import re
-from typing import List, Dict
 
-# ... existing RISK_LABELS and classify_legal_risk above ...
+@lru_cache(maxsize=128)
+def _split_sections(text: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Cached (title, body) pairs for a document, so repeated risk scans of
+    the same text skip the split.
+    """
+    # PDFium emits \r\n; normalize so bodies don't carry stray \r
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
 
+    # Heading start offsets, closed by the end of the text
+    bounds = [m.start() for m in SECTION_PATTERN.finditer(text)]
+    if not bounds:
+        return ()
+    bounds.append(len(text))
+
+    sections = []
+    for start, end in pairwise(bounds):
+        block = text[start:end].strip()
 
-SECTION_PATTERN = re.compile(
-    r"(SECTION\s+\d+[A-Za-z0-9.\-]*.*?)(?=SECTION\s+\d+[A-Za-z0-9.\-]*|\Z)",
-    flags=re.IGNORECASE | re.DOTALL,
-)
+        # First line is the title, rest is body
+        # (if no body, still keep entire block as text)
+        title, _, body = block.partition("\n")
+        sections.append((title.strip(), body.strip() or block))
+    return tuple(sections)
 
 
 def split_into_sections(text: str) -> List[Dict[str, str]]:
@@ -65,45 +195,25 @@ def split_into_sections(text: str) -> List[Dict[str, str]]:
     if not text or not text.strip():
         return []
 
-    sections = []
-    matches = list(SECTION_PATTERN.finditer(text))
+    matches = _split_sections(text)
 
     if matches:
-        for match in matches:
-            block = match.group(1).strip()
-
-            # First line is the title, rest is body
-            lines = block.splitlines()
-            if not lines:
-                continue
-
-            title = lines[0].strip()
-            body = "\n".join(lines[1:]).strip()
-            if not body:
-                # If no body, still keep entire block as text
-                body = block
-
-            sections.append(
-                {
-                    "title": title,
-                    "text": body,
-                }
-            )
+        sections = [{"title": title, "text": body} for title, body in matches]
     else:
         # Fallback: treat the entire text as one section
-        sections.append(
+        sections = [
             {
                 "title": "Full Document",
                 "text": text.strip(),
             }
-        )
+        ]
 
     return sections
 
 
 def classify_legal_risk_sections(text: str) -> List[Dict[str, object]]:
     """
-    Runs legal risk classification per detected section.
+    Runs legal risk classification per detected section (batched).
     Returns a list of:
       {
         "title": str,
@@ -113,17 +223,18 @@ def classify_legal_risk_sections(text: str) -> List[Dict[str, object]]:
       }
     """
     raw_sections = split_into_sections(text)
-    results = []
 
-    for section in raw_sections:
-        sec_text = section["text"]
-        scores = classify_legal_risk(sec_text)
+    # All sections go through the classifier in a single batched call
+    all_scores = classify_legal_risk_batch([sec["text"] for sec in raw_sections])
+
+    results = []
+    for section, scores in zip(raw_sections, all_scores):
         top_label = max(scores.items(), key=lambda x: x[1])[0]
 
         results.append(
             {
                 "title": section["title"],
-                "text": sec_text,
+                "text": section["text"],
                 "top_label": top_label,
                 "scores": scores,
             }
@@ -0,0 +1,76 @@
+"""
+Celery tasks for the long-running pipelines (RAG summarization, /analyze).
+
+Run a worker with:
+    celery -A src.tasks worker --loglevel=info
+"""
+import asyncio
+import os
+
+from celery import Celery
+
+from .summarize import DEFAULT_NUM_BEAMS, summarize_batch
+from .ner import extract_entities
+from .qa import answer_question
+from .rag import summarize_rag
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+
+celery_app = Celery(
+    "legal_assistant",
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_RESULT_BACKEND,
+)
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    result_expires=3600,
+)
+
+# One event loop per worker process: the shared Groq httpx client keeps
+# pooled connections bound to the loop that opened them.
+_loop = None
+
+
+def _run(coro):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+@celery_app.task(name="summarize_rag")
+def summarize_rag_task(text: str, top_k: int = 5) -> dict:
+    """
+    Background version of /summarize_rag.
+    """
+    return _run(summarize_rag(full_text=text, top_k=top_k))
+
+
+@celery_app.task(name="analyze")
+def analyze_task(
+    text: str,
+    question: str | None = None,
+    max_new_tokens: int = 256,
+    num_beams: int = DEFAULT_NUM_BEAMS,
+) -> dict:
+    """
+    Background version of /analyze (summary + NER + optional QA).
+    Uses the same decode settings as /analyze, so results match.
+    """
+    summary = summarize_batch(
+        [text], max_new_tokens=max_new_tokens, num_beams=num_beams
+    )[0]
+    entities = extract_entities(text)["entities"]
+
+    qa = None
+    if question:
+        qa = answer_question(question=question, context=text)
+
+    return {
+        "summary": summary,
+        "entities": entities,
+        "qa": qa,
+    }
@@ -0,0 +1,31 @@
+import os
+
+import torch
+
+# Set TORCH_COMPILE=0 to skip torch.compile (e.g. for fast dev restarts)
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "1") == "1"
+
+
+def _is_quantized(model: torch.nn.Module) -> bool:
+    # bitsandbytes models set is_quantized; dynamic int8 swaps in these Linears
+    if getattr(model, "is_quantized", False):
+        return True
+    return any(
+        isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in model.modules()
+    )
+
+
+def compile_forward(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    torch.compile the model's forward in place, so generate() and HF
+    pipelines (which call the module) run the compiled graph.
+
+    No-op on torch < 2, with TORCH_COMPILE=0, or for int8-quantized models.
+    """
+    if not TORCH_COMPILE or int(torch.__version__.split(".")[0]) < 2:
+        return model
+    if _is_quantized(model):
+        return model
+    # dynamic=True: sequence length changes on every call / decode step
+    model.forward = torch.compile(model.forward, dynamic=True)
+    return model
@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+
+# Enable the Redis code path; the real client is replaced below and never connects
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src import groq_qa
+
+PAYLOAD = {"model": groq_qa.GROQ_MODEL_NAME, "messages": [{"role": "user", "content": "q"}]}
+
+
+class FakeRedis:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.store = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        if self.fail:
+            raise RedisConnectionError("redis down")
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        if self.fail:
+            raise RedisConnectionError("redis down")
+        self.store[key] = value
+        self.ttls[key] = ttl
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def json(self):
+        return {"choices": [{"message": {"content": " groq reply "}}]}
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """
+    Replace the Groq HTTP call and start from an empty in-process cache.
+    Returns the list of payloads sent to the API.
+    """
+    calls = []
+
+    async def fake_post(url, headers=None, json=None):
+        calls.append(json)
+        return FakeResponse()
+
+    monkeypatch.setattr(groq_qa._client, "post", fake_post)
+    groq_qa._response_cache.clear()
+    return calls
+
+
+def test_redis_hit_skips_api(monkeypatch, api_calls):
+    redis = FakeRedis()
+    redis.store[groq_qa._cache_key(PAYLOAD)] = "cached reply"
+    monkeypatch.setattr(groq_qa, "_redis", redis)
+
+    assert asyncio.run(groq_qa._chat_completion(PAYLOAD)) == "cached reply"
+    assert api_calls == []
+
+
+def test_miss_calls_api_and_stores_with_ttl(monkeypatch, api_calls):
+    redis = FakeRedis()
+    monkeypatch.setattr(groq_qa, "_redis", redis)
+
+    assert asyncio.run(groq_qa._chat_completion(PAYLOAD)) == "groq reply"
+    assert len(api_calls) == 1
+
+    key = groq_qa._cache_key(PAYLOAD)
+    assert redis.store[key] == "groq reply"
+    assert redis.ttls[key] == groq_qa.GROQ_CACHE_TTL
+
+    # Second call is served from the in-process cache
+    assert asyncio.run(groq_qa._chat_completion(PAYLOAD)) == "groq reply"
+    assert len(api_calls) == 1
+
+
+def test_redis_error_falls_back_to_api(monkeypatch, api_calls):
+    monkeypatch.setattr(groq_qa, "_redis", FakeRedis(fail=True))
+
+    assert asyncio.run(groq_qa._chat_completion(PAYLOAD)) == "groq reply"
+    assert len(api_calls) == 1